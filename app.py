@@ -8,18 +8,28 @@ Web arayüzü ve REST API burada yönetilir.
 """
 
 import os
+import csv
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pickle
 import pandas as pd
 import numpy as np
 import re
-from flask import Flask, request, render_template, jsonify, redirect, url_for, flash
+import hashlib
+import functools
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, render_template, jsonify, redirect, url_for, flash, g, has_app_context, has_request_context, make_response
 from flask_cors import CORS
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from sqlalchemy.exc import SQLAlchemyError
 import logging
 from dotenv import load_dotenv
 import sys
+import time
 import datetime
 import jwt
 from datetime import timedelta
@@ -40,6 +50,29 @@ except ImportError as e:
     print(f"Import hatası: {e}")
     print("ml_recommendation_engine modülleri yüklenemedi!")
 
+# Redis opsiyonel: yoksa TMDb yanıtları önbelleğe alınmadan çalışılır
+try:
+    import redis
+except ImportError:
+    redis = None
+    print("redis paketi bulunamadı, TMDb önbelleği devre dışı")
+
+# orjson opsiyonel: yoksa Flask'ın standart JSON kodlayıcısı kullanılır
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("orjson paketi bulunamadı, standart JSON kodlayıcı kullanılacak")
+
+# JSON sağlayıcı arayüzü Flask 2.2 ile geldi; eski sürümlerde orjson yalnızca
+# TMDb/Redis yanıtlarını çözmek için kullanılır
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None
+    if orjson is not None:
+        print("Flask 2.2+ bulunamadı, jsonify yanıtları standart JSON kodlayıcı ile üretilecek")
+
 # Ortam değişkenlerini yükle
 load_dotenv()
 
@@ -50,6 +83,27 @@ app = Flask(__name__,
 
 CORS(app)  # CORS desteği ekle
 
+if orjson is not None and DefaultJSONProvider is not None:
+    class OrjsonJSONProvider(DefaultJSONProvider):
+        """jsonify yanıtlarını orjson ile serileştirir (NumPy değerleri dahil)"""
+
+        def options(self):
+            option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            return option | orjson.OPT_SORT_KEYS if self.sort_keys else option
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default, option=self.options()).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            body = orjson.dumps(obj, default=self.default, option=self.options())
+            return self._app.response_class(body, mimetype=self.mimetype)
+
+    app.json = OrjsonJSONProvider(app)
+
 # Logging yapılandırması
 logging.basicConfig(
     level=logging.INFO,
@@ -62,6 +116,7 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'gizli-anahtar-degistirin')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///movieapp.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 TMDB_API_KEY = os.getenv('TMDB_API_KEY', '')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
 # Database ve Auth kurulumu
 from db_models import db, bcrypt, User, Rating, WatchlistItem, Item
@@ -87,6 +142,14 @@ CB_MODEL_PATH = os.path.join(MODEL_DIR, 'content_based_model.pkl')
 HYBRID_MODEL_PATH = os.path.join(MODEL_DIR, 'hybrid_model.pkl')
 ITEMS_DATA_PATH = os.path.join(DATA_DIR, 'items.csv')
 RATINGS_DATA_PATH = os.path.join(DATA_DIR, 'ratings.csv')
+RATING_COLUMNS = ['user_id', 'item_id', 'rating', 'timestamp']
+# Satır başına 20 bayt (varsayılan int64/float64 ile 32 bayt)
+RATING_DTYPES = {'user_id': 'int32', 'item_id': 'int32', 'rating': 'float32', 'timestamp': 'int64'}
+
+# HTTP önbellek politikaları
+API_CACHE_CONTROL = 'public, max-age=300, stale-while-revalidate=60'
+SIMILAR_CACHE_CONTROL = 'public, max-age=3600'  # Yalnızca yeniden eğitimde değişir
+PAGE_CACHE_CONTROL = 'private, max-age=300'  # Sayfa oturum bilgisini içerir
 
 # Dizinleri oluştur
 os.makedirs(MODEL_DIR, exist_ok=True)
@@ -96,9 +159,74 @@ os.makedirs(DATA_DIR, exist_ok=True)
 cf_model = None
 cb_model = None
 hybrid_model = None
+# Modeller ilk ihtiyaç anında bir kez yüklenir (başlangıcı bloklamaz)
+models_loaded = False
+models_lock = threading.Lock()
 items_df = None
+items_by_id = {}  # item_id -> içerik bilgisi (O(1) erişim için)
+item_cards = {}  # item_id -> API yanıtına hazır, temizlenmiş alanlar
+EMPTY_ITEM_CARD = {'title': '', 'content_type': '', 'poster_path': '', 'overview': ''}
 ratings_df = None
-user_watchlist = {}
+# Anonim izleme listesi Redis hash'inde tutulur (çoklu worker'da ortak);
+# Redis kullanılamazsa süreç içi sözlüğe geri düşülür
+ANONYMOUS_WATCHLIST_KEY = 'watchlist:anonymous'
+local_watchlist = {}
+
+# TMDb için bağlantı havuzlu HTTP oturumu (TCP/TLS bağlantıları yeniden kullanılır)
+TMDB_TIMEOUT = (3, 10)
+tmdb_session = requests.Session()
+tmdb_session.mount('https://', HTTPAdapter(
+    pool_connections=50,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504])
+))
+
+# TMDb hız sınırı (10 saniyede 40 istek) ve eşzamanlı istek üst sınırı
+TMDB_RATE_LIMIT = 40
+TMDB_RATE_PERIOD = 10
+TMDB_MAX_CONCURRENCY = 10
+
+class TokenBucket:
+    """İş parçacıkları arasında paylaşılan token bucket hız sınırlayıcı"""
+
+    def __init__(self, rate, period):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / period
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bir token alınana kadar bekle"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+tmdb_limiter = TokenBucket(TMDB_RATE_LIMIT, TMDB_RATE_PERIOD)
+tmdb_semaphore = threading.BoundedSemaphore(TMDB_MAX_CONCURRENCY)
+
+# Birbirinden bağımsız TMDb çağrılarını eşzamanlı çalıştırmak için iş parçacığı havuzu
+tmdb_executor = ThreadPoolExecutor(max_workers=10)
+
+# Süresi geçmiş önbellek kopyalarını arka planda yenilemek için havuz
+refresh_executor = ThreadPoolExecutor(max_workers=4)
+
+# Popüler listeler arka planda periyodik olarak yenilenir; istekler bellekten okur
+POPULAR_REFRESH_INTERVAL = 300
+popular_lists = {'movie': [], 'tv': []}
+popular_refresher = None
+
+# Redis istemcisi (bağlantı ilk komutta kurulur)
+redis_client = None
+if redis is not None and REDIS_URL:
+    redis_client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5, socket_timeout=0.5)
 
 # --- Yardımcı Fonksiyonlar ---
 
@@ -112,45 +240,185 @@ def convert_numpy_types(obj):
         return obj.tolist()
     return obj
 
+# clean_text için önceden derlenmiş desenler
+CONTROL_CHARS_RE = re.compile(r'[\n\r\t\\"]')
+WHITESPACE_RE = re.compile(r'\s+')
+
 def clean_text(text):
     """Metni JSON serileştirme için güvenli hale getirir"""
     if not isinstance(text, str):
         return ""
-    text = re.sub(r'[\n\r\t\\"]', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+    return WHITESPACE_RE.sub(' ', CONTROL_CHARS_RE.sub(' ', text)).strip()
 
 def load_models():
     """Modelleri yükle"""
     global cf_model, cb_model, hybrid_model
 
+    # NumPy dizileri bellek eşlemeli açılır; worker'lar aynı sayfaları paylaşır
     if os.path.exists(CF_MODEL_PATH):
-        cf_model = CollaborativeFiltering.load(CF_MODEL_PATH)
+        cf_model = CollaborativeFiltering.load(CF_MODEL_PATH, mmap_mode='r')
         logger.info("İşbirlikçi filtreleme modeli yüklendi")
 
     if os.path.exists(CB_MODEL_PATH):
-        cb_model = ContentBasedFiltering.load(CB_MODEL_PATH)
+        cb_model = ContentBasedFiltering.load(CB_MODEL_PATH, mmap_mode='r')
         logger.info("İçerik tabanlı filtreleme modeli yüklendi")
 
     if os.path.exists(HYBRID_MODEL_PATH):
-        hybrid_model = HybridRecommender.load(HYBRID_MODEL_PATH)
+        hybrid_model = HybridRecommender.load(HYBRID_MODEL_PATH, mmap_mode='r')
         logger.info("Hibrit model yüklendi")
 
+def ensure_models_loaded():
+    """Modelleri henüz yüklenmediyse bir kez yükle"""
+    global models_loaded
+
+    if models_loaded:
+        return
+    with models_lock:
+        if not models_loaded:
+            load_models()
+            models_loaded = True
+
+def read_csv_cached(csv_path):
+    """CSV dosyasını oku; yanında güncel bir .pkl kopyası varsa onu kullan"""
+    pkl_path = csv_path + '.pkl'
+    if os.path.exists(pkl_path) and os.path.getmtime(pkl_path) >= os.path.getmtime(csv_path):
+        try:
+            return pd.read_pickle(pkl_path)
+        except Exception as e:
+            # Bozuk/yarım kopya (EOFError, UnpicklingError vb.): CSV'den okunur ve kopya yeniden yazılır
+            logger.warning(f"Pickle önbelleği okunamadı ({pkl_path}), CSV kullanılacak: {str(e)}")
+
+    # İlk yüklemede (veya CSV değiştiyse) pickle kopyasını yenile
+    df = pd.read_csv(csv_path)
+    # Önce geçici dosyaya yazılıp yerine taşınır; okuyucular yarım dosya görmez
+    tmp_path = f"{pkl_path}.{os.getpid()}.tmp"
+    try:
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, pkl_path)
+    except OSError as e:
+        logger.warning(f"Pickle önbelleği yazılamadı ({pkl_path}): {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return df
+
 def load_data():
     """Verileri yükle"""
-    global items_df, ratings_df
+    global items_df, items_by_id, item_cards, ratings_df
 
     if os.path.exists(ITEMS_DATA_PATH):
-        items_df = pd.read_csv(ITEMS_DATA_PATH)
+        items_df = read_csv_cached(ITEMS_DATA_PATH)
+        # Tekrarlanan item_id'lerde ilk kayıt geçerli (eski iloc[0] davranışı).
+        # astype(object) NumPy skalerlerini bir kez saf Python tiplerine çevirir;
+        # NaN'lar da bir kez None yapılır, istek yolunda pd.isna gerekmez.
+        unique_items = items_df.drop_duplicates('item_id')
+        items_by_id = (unique_items
+                       .astype(object)
+                       .where(unique_items.notna(), None)
+                       .set_index('item_id', drop=False)
+                       .to_dict(orient='index'))
+        item_cards = build_item_cards(unique_items)
         logger.info(f"İçerik verileri yüklendi: {len(items_df)} öğe")
 
     if os.path.exists(RATINGS_DATA_PATH):
-        ratings_df = pd.read_csv(RATINGS_DATA_PATH)
+        ratings_df = read_csv_cached(RATINGS_DATA_PATH)
+
+    # Kullanıcıların uygulama üzerinden verdiği puanlar veritabanında tutulur
+    try:
+        db_ratings = load_db_ratings()
+    except SQLAlchemyError as e:
+        logger.warning(f"Veritabanı değerlendirmeleri okunamadı: {str(e)}")
+        db_ratings = None
+
+    if db_ratings is not None and not db_ratings.empty:
+        ratings_df = db_ratings if ratings_df is None else pd.concat([ratings_df, db_ratings], ignore_index=True)
+
+    if ratings_df is not None:
+        # Aynı kullanıcı-öğe çifti için son kayıt (veritabanı) geçerlidir
+        ratings_df = ratings_df.drop_duplicates(subset=['user_id', 'item_id'], keep='last', ignore_index=True)
+        ratings_df['timestamp'] = ratings_df['timestamp'].fillna(0)
+        ratings_df = ratings_df.astype(RATING_DTYPES)
         logger.info(f"Değerlendirme verileri yüklendi: {len(ratings_df)} değerlendirme")
 
+def build_item_cards(items):
+    """API yanıtlarında kullanılan içerik alanlarını bir kez, sütun bazında hazırla"""
+    cards = pd.DataFrame(index=items['item_id'].astype(object))
+    # clean_text ile aynı: metin olmayan değerler boş metne döner
+    for column in ('title', 'overview'):
+        cards[column] = (items[column].astype(object).str
+                         .replace(CONTROL_CHARS_RE.pattern, ' ', regex=True).str
+                         .replace(WHITESPACE_RE.pattern, ' ', regex=True).str
+                         .strip()
+                         .fillna('')
+                         .to_numpy())
+    # Eksik değerler boş metne döner
+    for column in ('content_type', 'poster_path'):
+        values = items[column].astype(object)
+        cards[column] = values.where(values.notna(), '').to_numpy()
+    return cards[['title', 'content_type', 'poster_path', 'overview']].to_dict(orient='index')
+
+def load_db_ratings():
+    """Veritabanındaki değerlendirmeleri ratings_df formatında döndür"""
+    with app.app_context():
+        rows = db.session.query(Rating.user_id, Rating.item_id, Rating.rating, Rating.updated_at).all()
+    db_ratings = pd.DataFrame(rows, columns=RATING_COLUMNS)
+    # updated_at UTC datetime olarak saklanır, Unix zaman damgasına çevir
+    db_ratings['timestamp'] = (pd.to_datetime(db_ratings['timestamp']) - pd.Timestamp(0)).dt.total_seconds()
+    return db_ratings
+
+def append_rating_csv(user_id, item_id, rating, timestamp):
+    """Değerlendirmeyi ratings.csv'nin sonuna ekle; aynı çiftin eski satırları load_data'da ayıklanır"""
+    write_header = not os.path.exists(RATINGS_DATA_PATH)
+    with open(RATINGS_DATA_PATH, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(RATING_COLUMNS)
+        writer.writerow([user_id, item_id, rating, timestamp])
+
+def save_rating(user_id, item_id, rating, media_type='movie'):
+    """Değerlendirmeyi kalıcı olarak kaydet ve bellekteki tabloya işle"""
+    global ratings_df
+
+    # Değerler veritabanına dokunmadan önce doğrulanır; geçersizse ValueError/TypeError
+    user_id, item_id, rating = int(user_id), int(item_id), float(rating)
+    if not np.isfinite(rating):
+        raise ValueError('Geçersiz puan')
+
+    timestamp = int(pd.Timestamp.now().timestamp())
+    new_rating = pd.DataFrame({
+        'user_id': [user_id],
+        'item_id': [item_id],
+        'rating': [rating],
+        'timestamp': [timestamp]
+    }).astype(RATING_DTYPES)
+
+    # Rating.user_id users tablosuna yabancı anahtardır: yalnızca oturum açmış
+    # kullanıcının kendi puanı veritabanına yazılır. Anonim ve öneri motoru
+    # kullanıcıları (ör. 1000+ MovieLens kimlikleri) ratings.csv'ye eklenir.
+    if has_request_context() and current_user.is_authenticated and current_user.id == user_id:
+        # (user_id, item_id, media_type) benzersiz indeksi üzerinden upsert
+        existing = Rating.query.filter_by(user_id=user_id, item_id=item_id, media_type=media_type).first()
+        if existing:
+            existing.rating = rating
+        else:
+            db.session.add(Rating(user_id=user_id, item_id=item_id, media_type=media_type, rating=rating))
+        db.session.commit()
+    else:
+        append_rating_csv(user_id, item_id, rating, timestamp)
+
+    # Modeller bellekteki tabloyu kullandığı için onu da güncelle
+    if ratings_df is None:
+        ratings_df = new_rating.iloc[:0]
+
+    mask = (ratings_df['user_id'] == user_id) & (ratings_df['item_id'] == item_id)
+    if mask.any():
+        ratings_df.loc[mask, 'rating'] = new_rating.at[0, 'rating']
+        ratings_df.loc[mask, 'timestamp'] = timestamp
+    else:
+        ratings_df = pd.concat([ratings_df, new_rating], ignore_index=True)
+
 def train_models():
     """Modelleri eğit ve kaydet"""
-    global cf_model, cb_model, hybrid_model, items_df, ratings_df
+    global cf_model, cb_model, hybrid_model, models_loaded, items_df, ratings_df
 
     if items_df is None or items_df.empty:
         logger.warning('Eğitim için veri bulunamadı')
@@ -179,6 +447,8 @@ def train_models():
         hybrid_model.save(HYBRID_MODEL_PATH)
         logger.info(f'Hibrit model kaydedildi: {HYBRID_MODEL_PATH}')
 
+        models_loaded = True
+
         return True
     except Exception as e:
         logger.error(f'Model eğitim hatası: {str(e)}')
@@ -217,6 +487,126 @@ def auth_required(f):
     decorated.__name__ = f.__name__
     return decorated
 
+def parse_json(data):
+    """JSON metnini/baytlarını çöz (orjson kuruluysa onunla)"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def cache_get(key):
+    """Redis'ten JSON değer oku, önbellek yoksa veya hata olursa None döner"""
+    if redis_client is None:
+        return None
+    try:
+        cached = redis_client.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Redis okuma hatası: {str(e)}")
+        return None
+    return parse_json(cached) if cached is not None else None
+
+def cache_set(key, ttl, value):
+    """Değeri JSON olarak Redis'e ttl saniyeliğine yaz"""
+    if redis_client is None:
+        return
+    try:
+        redis_client.setex(key, ttl, json.dumps(value))
+    except redis.RedisError as e:
+        logger.warning(f"Redis yazma hatası: {str(e)}")
+
+def record_tmdb_cache(hit):
+    """İstek boyunca TMDb önbelleğinin ıskalanıp ıskalanmadığını işaretle (X-Cache için)"""
+    if has_app_context():
+        # Önbellekli yardımcılardan biri bile ıskalarsa yanıt MISS sayılır
+        g.tmdb_cache_hit = g.get('tmdb_cache_hit', True) and hit
+
+def tmdb_cache_key(prefix, fn, signature, args, kwargs):
+    """Fonksiyon adı ve varsayılanlarla tamamlanmış, sıralı parametrelerden önbellek anahtarı üret"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    raw_key = f"{fn.__name__}:{sorted(bound.arguments.items())}"
+    return prefix + hashlib.md5(raw_key.encode()).hexdigest()
+
+def tmdb_cached(ttl):
+    """TMDb yardımcı fonksiyonlarının sonuçlarını Redis'te ttl saniye saklayan dekoratör"""
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = tmdb_cache_key('tmdb:', fn, signature, args, kwargs)
+
+            cached = cache_get(key)
+            if cached is not None:
+                record_tmdb_cache(hit=True)
+                return cached
+
+            record_tmdb_cache(hit=False)
+            result = fn(*args, **kwargs)
+            # Hata durumunda dönen boş sonuçları önbelleğe alma
+            if result:
+                cache_set(key, ttl, result)
+            return result
+        return wrapper
+    return decorator
+
+def refresh_cached(key, ttl, fn, args, kwargs):
+    """Fonksiyonu çalıştır ve sonucu alınma zamanıyla birlikte önbelleğe yaz"""
+    result = fn(*args, **kwargs)
+    if result:
+        cache_set(key, ttl, {'fetched_at': time.time(), 'data': result})
+    return result
+
+def schedule_refresh(key, ttl, fn, args, kwargs):
+    """Anahtar için arka planda tek bir yenileme başlat"""
+    # Aynı anahtarı birden fazla worker'ın aynı anda yenilemesini engelle
+    try:
+        acquired = redis_client.set(key + ':refreshing', 1, nx=True, ex=30)
+    except redis.RedisError as e:
+        logger.warning(f"Redis yenileme kilidi alınamadı: {str(e)}")
+        return
+    if acquired:
+        refresh_executor.submit(refresh_cached, key, ttl, fn, args, kwargs)
+
+def tmdb_stale_while_revalidate(fresh_ttl, ttl):
+    """
+    Önbellekteki kopyayı hemen döndüren dekoratör; kopya fresh_ttl saniyeden
+    eskiyse arka planda yenilenir, ttl saniye sonra tamamen silinir
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = tmdb_cache_key('tmdb:swr:', fn, signature, args, kwargs)
+
+            cached = cache_get(key)
+            if cached is not None:
+                record_tmdb_cache(hit=True)
+                if time.time() - cached['fetched_at'] >= fresh_ttl:
+                    schedule_refresh(key, ttl, fn, args, kwargs)
+                return cached['data']
+
+            record_tmdb_cache(hit=False)
+            return refresh_cached(key, ttl, fn, args, kwargs)
+
+        def refresh(*args, **kwargs):
+            """Önbelleği atlayarak TMDb'den al ve sonucu önbelleğe yaz"""
+            key = tmdb_cache_key('tmdb:swr:', fn, signature, args, kwargs)
+            return refresh_cached(key, ttl, fn, args, kwargs)
+
+        wrapper.refresh = refresh
+        return wrapper
+    return decorator
+
+def tmdb_get(url, params):
+    """Ortak oturum üzerinden TMDb isteği yap ve JSON yanıtını döndür"""
+    # Tüm TMDb çağrıları aynı sınırlayıcıdan geçer (429 hatalarını önler)
+    with tmdb_semaphore:
+        tmdb_limiter.acquire()
+        response = tmdb_session.get(url, params=params, timeout=TMDB_TIMEOUT)
+    response.raise_for_status()
+    # Ham baytlar doğrudan çözülür (requests gzip yanıtı zaten açar)
+    return parse_json(response.content)
+
+@tmdb_cached(120)
 def search_movies(query, page=1):
     """TMDb API'dan film arama"""
     try:
@@ -227,13 +617,12 @@ def search_movies(query, page=1):
             'page': page,
             'language': 'tr-TR'
         }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json().get('results', [])
+        return tmdb_get(url, params).get('results', [])
     except Exception as e:
         logger.error(f"Film arama hatası: {str(e)}")
         return []
 
+@tmdb_cached(120)
 def search_tv_series(query, page=1):
     """TMDb API'dan dizi arama"""
     try:
@@ -244,13 +633,12 @@ def search_tv_series(query, page=1):
             'page': page,
             'language': 'tr-TR'
         }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json().get('results', [])
+        return tmdb_get(url, params).get('results', [])
     except Exception as e:
         logger.error(f"Dizi arama hatası: {str(e)}")
         return []
 
+@tmdb_cached(3600)
 def get_movie_details(movie_id):
     """TMDb API'dan film detayları"""
     try:
@@ -260,13 +648,12 @@ def get_movie_details(movie_id):
             'language': 'tr-TR',
             'append_to_response': 'credits,videos,similar'
         }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        return tmdb_get(url, params)
     except Exception as e:
         logger.error(f"Film detay hatası: {str(e)}")
         return None
 
+@tmdb_cached(3600)
 def get_tv_details(tv_id):
     """TMDb API'dan dizi detayları"""
     try:
@@ -276,39 +663,173 @@ def get_tv_details(tv_id):
             'language': 'tr-TR',
             'append_to_response': 'credits,videos,similar'
         }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        return tmdb_get(url, params)
     except Exception as e:
         logger.error(f"Dizi detay hatası: {str(e)}")
         return None
 
+@tmdb_stale_while_revalidate(fresh_ttl=300, ttl=3600)
 def get_popular_movies(page=1):
     """Popüler filmler"""
     try:
         url = "https://api.themoviedb.org/3/movie/popular"
         params = {'api_key': TMDB_API_KEY, 'language': 'tr-TR', 'page': page}
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json().get('results', [])
+        return tmdb_get(url, params).get('results', [])
     except Exception as e:
         logger.error(f"Popüler film hatası: {str(e)}")
         return []
 
+@tmdb_stale_while_revalidate(fresh_ttl=300, ttl=3600)
 def get_popular_tv(page=1):
     """Popüler diziler"""
     try:
         url = "https://api.themoviedb.org/3/tv/popular"
         params = {'api_key': TMDB_API_KEY, 'language': 'tr-TR', 'page': page}
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json().get('results', [])
+        return tmdb_get(url, params).get('results', [])
     except Exception as e:
         logger.error(f"Popüler dizi hatası: {str(e)}")
         return []
 
+def get_anonymous_watchlist():
+    """Anonim izleme listesini {anahtar: öğe verisi} sözlüğü olarak döndür"""
+    if redis_client is not None:
+        try:
+            raw = redis_client.hgetall(ANONYMOUS_WATCHLIST_KEY)
+            return {key.decode(): parse_json(value) for key, value in raw.items()}
+        except redis.RedisError as e:
+            logger.warning(f"Redis izleme listesi okunamadı: {str(e)}")
+    return dict(local_watchlist)
+
+def add_to_anonymous_watchlist(key, data):
+    """Anonim izleme listesine öğe ekle"""
+    if redis_client is not None:
+        try:
+            redis_client.hset(ANONYMOUS_WATCHLIST_KEY, key, json.dumps(data))
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Redis izleme listesine yazılamadı: {str(e)}")
+    local_watchlist[key] = data
+
+def remove_from_anonymous_watchlist(key):
+    """Anonim izleme listesinden öğe çıkar"""
+    if redis_client is not None:
+        try:
+            redis_client.hdel(ANONYMOUS_WATCHLIST_KEY, key)
+            return
+        except redis.RedisError as e:
+            logger.warning(f"Redis izleme listesinden silinemedi: {str(e)}")
+    local_watchlist.pop(key, None)
+
+def watchlist_by_type(watchlist_items):
+    """İzleme listesini template'lerin beklediği {'movie': [...], 'tv': [...]} biçimine çevir"""
+    by_type = {'movie': [], 'tv': []}
+    for item_data in watchlist_items.values():
+        media_type = item_data.get('media_type', 'movie')
+        item_id = item_data.get('item_id')
+        if media_type in by_type and item_id:
+            by_type[media_type].append(item_id)
+    return by_type
+
+def run_parallel(*calls):
+    """Argümansız çağrıları havuzda eşzamanlı çalıştır, sonuçları aynı sırayla döndür"""
+    futures = [tmdb_executor.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+def refresh_popular_lists():
+    """Popüler film ve dizi listelerini TMDb'den alıp bellekteki kopyayı değiştir"""
+    global popular_lists
+
+    # Önbellekteki (bir önceki turdan kalma) kopya yerine her turda TMDb'den
+    # güncel liste alınır ve Redis'e de yazılır
+    movies, tv = run_parallel(get_popular_movies.refresh, get_popular_tv.refresh)
+    # Hata durumunda boş liste gelir; eldeki son liste korunur
+    popular_lists = {'movie': movies or popular_lists['movie'],
+                     'tv': tv or popular_lists['tv']}
+
+def popular_refresh_loop():
+    """Popüler listeleri POPULAR_REFRESH_INTERVAL saniyede bir yenile"""
+    while True:
+        try:
+            refresh_popular_lists()
+        except Exception as e:
+            logger.warning(f"Popüler liste yenileme hatası: {str(e)}")
+        time.sleep(POPULAR_REFRESH_INTERVAL)
+
+def start_popular_refresher():
+    """Arka plan yenileyicisini (bir kez) başlat"""
+    global popular_refresher
+
+    if popular_refresher is None:
+        popular_refresher = threading.Thread(target=popular_refresh_loop, name='popular-refresher', daemon=True)
+        popular_refresher.start()
+
+def get_popular_lists():
+    """Bellekteki popüler listeleri döndür; henüz dolmadıysa TMDb'den al"""
+    lists = popular_lists
+    if lists['movie'] and lists['tv']:
+        return lists['movie'], lists['tv']
+    return run_parallel(get_popular_movies, get_popular_tv)
+
+def enrich_recommendations(recommendations):
+    """(item_id, score) listesini içerik bilgileriyle API yanıt biçimine çevir"""
+    # Alanlar load_data sırasında hazırlanır; burada yalnızca skorlarla birleştirilir
+    results = []
+    for item_id, score in recommendations:
+        item_id = convert_numpy_types(item_id)
+        results.append({
+            'item_id': item_id,
+            'score': convert_numpy_types(score),
+            **item_cards.get(item_id, EMPTY_ITEM_CARD)
+        })
+    return results
+
+def model_version():
+    """Model dosyalarının değişiklik zamanları (yeniden eğitimde değişir)"""
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else 0
+                 for path in (CF_MODEL_PATH, CB_MODEL_PATH, HYBRID_MODEL_PATH))
+
+def data_version():
+    """
+    Değerlendirme verisinin sürümü (ETag için)
+
+    Veritabanındaki son güncelleme zamanı ve kayıt sayısı ile CSV dosyalarının
+    değişiklik zamanlarından üretilir; yeniden başlatmada sıfırlanmaz ve tüm
+    worker'larda aynıdır.
+    """
+    try:
+        last_update, count = db.session.query(db.func.max(Rating.updated_at), db.func.count(Rating.id)).one()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.warning(f"Değerlendirme sürümü okunamadı: {str(e)}")
+        # Sürüm bilinemiyorsa hiçbir eski ETag eşleşmesin
+        return time.time()
+
+    file_mtimes = tuple(os.path.getmtime(path) if os.path.exists(path) else 0
+                        for path in (ITEMS_DATA_PATH, RATINGS_DATA_PATH))
+    return (str(last_update), count) + file_mtimes
+
+def response_etag(*parts):
+    """Verilen parçalardan ETag değeri üret"""
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+def is_not_modified(etag):
+    """İstemcideki kopya hâlâ geçerli mi (If-None-Match)"""
+    return request.if_none_match.contains_weak(etag)
+
+def cache_headers(response, cache_control, etag=None):
+    """Yanıta Cache-Control ve zayıf ETag başlıklarını ekle"""
+    response.headers['Cache-Control'] = cache_control
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    return response
+
+def not_modified_response(cache_control, etag):
+    """Gövdesiz 304 yanıtı"""
+    return cache_headers(app.response_class(status=304), cache_control, etag)
+
 def get_ml_recommendations(user_id, n=10):
     """Makine öğrenmesi tabanlı öneriler"""
+    ensure_models_loaded()
     try:
         if hybrid_model:
             return hybrid_model.recommend(user_id, n, ratings_df=ratings_df)
@@ -327,8 +848,7 @@ def inject_current_year():
 
 @app.context_processor
 def inject_user_watchlist():
-    global user_watchlist
-    return {'user_watchlist': user_watchlist}
+    return {'user_watchlist': watchlist_by_type(get_anonymous_watchlist())}
 
 # --- Authentication Routes ---
 
@@ -430,11 +950,13 @@ def profile():
 @app.route('/')
 def index():
     """Ana sayfa"""
-    popular_movies = get_popular_movies()[:8]
-    popular_tv = get_popular_tv()[:8]
-    return render_template('index.html',
-                         popular_movies=popular_movies,
-                         popular_tv=popular_tv)
+    popular_movies, popular_tv = get_popular_lists()
+    response = make_response(render_template('index.html',
+                                              popular_movies=popular_movies[:8],
+                                              popular_tv=popular_tv[:8]))
+    # Oturum çerezi değişince (giriş/çıkış, flash mesajı) tarayıcı kopyası kullanılmaz
+    response.vary.add('Cookie')
+    return cache_headers(response, PAGE_CACHE_CONTROL)
 
 @app.route('/search')
 def search():
@@ -443,8 +965,8 @@ def search():
     if not query:
         return render_template('search.html')
 
-    movie_results = search_movies(query)
-    tv_results = search_tv_series(query)
+    movie_results, tv_results = run_parallel(lambda: search_movies(query),
+                                             lambda: search_tv_series(query))
 
     return render_template('search.html',
                          query=query,
@@ -490,12 +1012,14 @@ def recommendations():
 
     # ML önerileri - template'in beklediği formatta
     ml_recommendations = []
+    ensure_models_loaded()
     if hybrid_model or cb_model:
         raw_recommendations = get_ml_recommendations(user_id, n=20)
         for item_id, score in raw_recommendations:
             item_id = convert_numpy_types(item_id)
-            if items_df is not None and item_id in items_df['item_id'].values:
-                item_info = items_df[items_df['item_id'] == item_id].iloc[0].to_dict()
+            info = items_by_id.get(item_id)
+            if info is not None:
+                item_info = dict(info)
                 # Template'in beklediği format: {'info': {...}, 'score': ...}
                 item_info['id'] = item_id  # 'item_id' yerine 'id' de ekle
                 item_info['score'] = convert_numpy_types(score)
@@ -505,32 +1029,24 @@ def recommendations():
                 })
 
     # Popüler içerikler
-    popular_movies = get_popular_movies()[:10]
-    popular_tv = get_popular_tv()[:10]
+    popular_movies, popular_tv = [items[:10] for items in get_popular_lists()]
     
-    # Template için user_watchlist'i uygun formata çevir
-    watchlist_by_type = {'movie': [], 'tv': []}
-    for key, item_data in user_watchlist.items():
-        media_type = item_data.get('media_type', 'movie')
-        item_id = item_data.get('item_id')
-        if media_type in watchlist_by_type and item_id:
-            watchlist_by_type[media_type].append(item_id)
-
     return render_template('recommendations.html',
                          ml_recommendations=ml_recommendations,
                          popular_movies=popular_movies,
                          popular_tv=popular_tv,
                          user_id=user_id,
-                         user_watchlist=watchlist_by_type)
+                         user_watchlist=watchlist_by_type(get_anonymous_watchlist()))
 
 @app.route('/watchlist')
 def watchlist():
     """İzleme listesi sayfası"""
     movie_items = []
     tv_items = []
+    anonymous_watchlist = get_anonymous_watchlist()
 
-    # user_watchlist'ten film ve dizi detaylarını al
-    for key, item_data in user_watchlist.items():
+    # İzleme listesindeki film ve dizilerin detaylarını al
+    for key, item_data in anonymous_watchlist.items():
         item_id = item_data.get('item_id')
         media_type = item_data.get('media_type', 'movie')
 
@@ -546,7 +1062,7 @@ def watchlist():
     return render_template('watchlist.html',
                           movie_items=movie_items,
                           tv_items=tv_items,
-                          watchlist=user_watchlist)
+                          watchlist=anonymous_watchlist)
 
 # --- REST API Routes ---
 
@@ -568,6 +1084,7 @@ def debug_movie(movie_id):
 @app.route('/api/health')
 def health_check():
     """Sağlık kontrolü"""
+    ensure_models_loaded()
     return jsonify({
         'status': 'ok',
         'version': '1.0.0',
@@ -587,6 +1104,12 @@ def api_recommendations(user_id):
     """Kullanıcı için öneriler API endpoint'i"""
     limit = request.args.get('limit', default=10, type=int)
     strategy = request.args.get('strategy', default='hybrid')
+    ensure_models_loaded()
+
+    # Yanıt yalnızca modellere, değerlendirmelere ve sorgu parametrelerine bağlı
+    etag = response_etag(model_version(), data_version(), request.full_path)
+    if is_not_modified(etag):
+        return not_modified_response(API_CACHE_CONTROL, etag)
 
     try:
         if strategy == 'collaborative' and cf_model:
@@ -598,31 +1121,15 @@ def api_recommendations(user_id):
         else:
             return jsonify({'error': 'Model yüklenmedi'}), 500
 
-        results = []
-        for item_id, score in recommendations:
-            item_id = convert_numpy_types(item_id)
-            score = convert_numpy_types(score)
-
-            item_info = {}
-            if items_df is not None and item_id in items_df['item_id'].values:
-                item_info = items_df[items_df['item_id'] == item_id].iloc[0].to_dict()
-                item_info = {k: convert_numpy_types(v) for k, v in item_info.items() if not pd.isna(v)}
-
-            results.append({
-                'item_id': item_id,
-                'score': score,
-                'title': clean_text(item_info.get('title', '')),
-                'content_type': item_info.get('content_type', ''),
-                'poster_path': item_info.get('poster_path', ''),
-                'overview': clean_text(item_info.get('overview', ''))
-            })
+        results = enrich_recommendations(recommendations)
 
-        return jsonify({
+        response = jsonify({
             'user_id': user_id,
             'strategy': strategy,
             'recommendations': results,
             'count': len(results)
         })
+        return cache_headers(response, API_CACHE_CONTROL, etag)
 
     except Exception as e:
         logger.error(f"Öneri API hatası: {str(e)}")
@@ -632,36 +1139,25 @@ def api_recommendations(user_id):
 def api_similar_items(item_id):
     """Benzer öğeler API endpoint'i"""
     limit = request.args.get('limit', default=10, type=int)
+    ensure_models_loaded()
 
     if cb_model is None:
         return jsonify({'error': 'İçerik tabanlı model yüklenmedi'}), 500
 
+    etag = response_etag(model_version(), request.full_path)
+    if is_not_modified(etag):
+        return not_modified_response(SIMILAR_CACHE_CONTROL, etag)
+
     try:
         similar_items = cb_model.get_similar_items(item_id, n=limit)
 
-        results = []
-        for similar_id, score in similar_items:
-            similar_id = convert_numpy_types(similar_id)
-            score = convert_numpy_types(score)
-
-            item_info = {}
-            if items_df is not None and similar_id in items_df['item_id'].values:
-                item_info = items_df[items_df['item_id'] == similar_id].iloc[0].to_dict()
-                item_info = {k: convert_numpy_types(v) for k, v in item_info.items() if not pd.isna(v)}
-
-            results.append({
-                'item_id': similar_id,
-                'score': score,
-                'title': clean_text(item_info.get('title', '')),
-                'content_type': item_info.get('content_type', ''),
-                'poster_path': item_info.get('poster_path', ''),
-                'overview': clean_text(item_info.get('overview', ''))
-            })
+        results = enrich_recommendations(similar_items)
 
-        return jsonify({
+        response = jsonify({
             'item_id': item_id,
             'similar_items': results
         })
+        return cache_headers(response, SIMILAR_CACHE_CONTROL, etag)
 
     except Exception as e:
         logger.error(f"Benzer öğe hatası: {str(e)}")
@@ -685,13 +1181,16 @@ def api_search():
     if content_type in ['all', 'tv']:
         results['tv_series'] = search_tv_series(query, page)
 
-    return jsonify(results)
+    response = jsonify(results)
+    # Yalnızca önbellekli bir TMDb yardımcısı çalıştıysa başlık eklenir
+    cache_hit = g.get('tmdb_cache_hit')
+    if cache_hit is not None:
+        response.headers['X-Cache'] = 'HIT' if cache_hit else 'MISS'
+    return response
 
 @app.route('/api/ratings', methods=['POST'])
 def api_add_rating():
     """Değerlendirme ekle"""
-    global ratings_df
-
     data = request.json
     user_id = data.get('user_id')
     item_id = data.get('item_id')
@@ -701,30 +1200,17 @@ def api_add_rating():
         return jsonify({'error': 'Eksik parametreler'}), 400
 
     try:
-        if ratings_df is None:
-            ratings_df = pd.DataFrame(columns=['user_id', 'item_id', 'rating', 'timestamp'])
-
-        mask = (ratings_df['user_id'] == user_id) & (ratings_df['item_id'] == item_id)
-        if mask.any():
-            ratings_df.loc[mask, 'rating'] = rating
-            ratings_df.loc[mask, 'timestamp'] = pd.Timestamp.now().timestamp()
-        else:
-            new_rating = pd.DataFrame({
-                'user_id': [user_id],
-                'item_id': [item_id],
-                'rating': [rating],
-                'timestamp': [pd.Timestamp.now().timestamp()]
-            })
-            ratings_df = pd.concat([ratings_df, new_rating], ignore_index=True)
-
-        ratings_df.to_csv(RATINGS_DATA_PATH, index=False)
+        save_rating(user_id, item_id, rating)
 
         return jsonify({
             'success': True,
             'message': 'Değerlendirme kaydedildi'
         })
 
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Geçersiz parametreler: {str(e)}'}), 400
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Değerlendirme hatası: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
@@ -781,21 +1267,18 @@ def api_watchlist():
             
             return jsonify({'success': True, 'message': 'Listeden çıkarıldı'})
     else:
-        # Anonim kullanıcılar için bellekte tut (eski davranış)
-        global user_watchlist
-        
+        # Anonim kullanıcılar için Redis hash'inde tut
         if request.method == 'GET':
-            return jsonify({'watchlist': list(user_watchlist.values())})
+            return jsonify({'watchlist': list(get_anonymous_watchlist().values())})
         elif request.method == 'POST':
             data = request.json
             item_id = str(data.get('item_id'))
-            user_watchlist[item_id] = data
+            add_to_anonymous_watchlist(item_id, data)
             return jsonify({'success': True, 'message': 'Listeye eklendi'})
         elif request.method == 'DELETE':
             data = request.json
             item_id = str(data.get('item_id'))
-            if item_id in user_watchlist:
-                del user_watchlist[item_id]
+            remove_from_anonymous_watchlist(item_id)
             return jsonify({'success': True, 'message': 'Listeden çıkarıldı'})
 
 
@@ -821,9 +1304,8 @@ def api_watchlist_add():
         
         return jsonify({'success': True, 'message': 'Listeye eklendi'})
     else:
-        global user_watchlist
         key = f"{media_type}_{item_id}"
-        user_watchlist[key] = {'item_id': item_id, 'media_type': media_type}
+        add_to_anonymous_watchlist(key, {'item_id': item_id, 'media_type': media_type})
         return jsonify({'success': True, 'message': 'Listeye eklendi'})
 
 
@@ -844,51 +1326,34 @@ def api_watchlist_remove():
         db.session.commit()
         return jsonify({'success': True, 'message': 'Listeden çıkarıldı'})
     else:
-        global user_watchlist
         key = f"{media_type}_{item_id}"
-        if key in user_watchlist:
-            del user_watchlist[key]
+        remove_from_anonymous_watchlist(key)
         return jsonify({'success': True, 'message': 'Listeden çıkarıldı'})
 
 @app.route('/api/rate', methods=['POST'])
 def api_rate():
     """Kullanıcı değerlendirmesi API endpoint'i"""
-    global ratings_df
-
     data = request.json
     media_type = data.get('media_type', 'movie')
     item_id = data.get('item_id')
     rating = data.get('rating')
-    user_id = data.get('user_id', 1)
+    user_id = data.get('user_id', current_user.id if current_user.is_authenticated else 1)
 
     if not item_id or not rating:
         return jsonify({'success': False, 'error': 'item_id ve rating gerekli'}), 400
 
     try:
-        if ratings_df is None:
-            ratings_df = pd.DataFrame(columns=['user_id', 'item_id', 'rating', 'timestamp'])
-
-        mask = (ratings_df['user_id'] == user_id) & (ratings_df['item_id'] == item_id)
-        if mask.any():
-            ratings_df.loc[mask, 'rating'] = rating
-            ratings_df.loc[mask, 'timestamp'] = pd.Timestamp.now().timestamp()
-        else:
-            new_rating = pd.DataFrame({
-                'user_id': [user_id],
-                'item_id': [item_id],
-                'rating': [rating],
-                'timestamp': [pd.Timestamp.now().timestamp()]
-            })
-            ratings_df = pd.concat([ratings_df, new_rating], ignore_index=True)
-
-        ratings_df.to_csv(RATINGS_DATA_PATH, index=False)
+        save_rating(user_id, item_id, rating, media_type=media_type)
 
         return jsonify({
             'success': True,
             'message': 'Değerlendirme kaydedildi'
         })
 
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Geçersiz parametreler: {str(e)}'}), 400
     except Exception as e:
+        db.session.rollback()
         logger.error(f'Değerlendirme hatası: {str(e)}')
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -902,12 +1367,12 @@ if __name__ == '__main__':
         db.create_all()
         logger.info("Database tabloları oluşturuldu/kontrol edildi")
 
-    # Verileri ve modelleri yükle
+    # Verileri yükle; modeller ilk istekte yüklenir
     load_data()
-    load_models()
+    start_popular_refresher()
     
     # Modeller yoksa eğit
-    if cb_model is None and items_df is not None:
+    if not os.path.exists(CB_MODEL_PATH) and items_df is not None:
         logger.info('ML modelleri bulunamadı, eğitim başlatılıyor...')
         train_models()
 
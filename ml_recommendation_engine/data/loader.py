@@ -581,10 +581,10 @@ class TMDBDataLoader:
             
         # İçerikler için genre bilgisi çıkar
         genres = []
-        for _, row in items_df.iterrows():
+        for tmdb_details in items_df['tmdb_details']:
             # tmdb_details dictionary olarak kontrol et
-            if isinstance(row['tmdb_details'], dict) and 'genres' in row['tmdb_details']:
-                tmdb_genres = row['tmdb_details']['genres']
+            if isinstance(tmdb_details, dict) and 'genres' in tmdb_details:
+                tmdb_genres = tmdb_details['genres']
                 if isinstance(tmdb_genres, list):
                     genre_names = [g['name'] for g in tmdb_genres if isinstance(g, dict) and 'name' in g]
                     genres.append(','.join(genre_names))
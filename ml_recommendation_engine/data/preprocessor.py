@@ -195,13 +195,11 @@ class DataPreprocessor:
         # Her sütunu uygun bir şekilde hazırla ve birleştir
         features = []
         
-        for _, row in df.iterrows():
+        for row in df[available_columns].itertuples(index=False, name=None):
             # Her sütunu dizeye dönüştür ve birleştir
             texts = []
             
-            for col in available_columns:
-                value = row.get(col, '')
-                
+            for col, value in zip(available_columns, row):
                 # Liste tipinde değerleri işle
                 if isinstance(value, list):
                     value = ' '.join(str(v) for v in value)
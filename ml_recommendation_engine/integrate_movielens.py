@@ -11,9 +11,17 @@ Adımlar:
 """
 
 import pandas as pd
+import numpy as np
 import os
+import re
+import json
+import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -24,49 +32,128 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 MOVIELENS_DIR = os.path.join(DATA_DIR, 'ml-latest-small')
 
+# MovieLens CSV sütun tipleri (tip çıkarımı yapılmaz, dar tipler daha az bellek kullanır)
+MOVIES_DTYPES = {'movieId': 'int32', 'title': 'object', 'genres': 'object'}
+RATINGS_DTYPES = {'userId': 'int32', 'movieId': 'int32', 'rating': 'float32', 'timestamp': 'int64'}
+LINKS_DTYPES = {'movieId': 'int32', 'imdbId': 'object', 'tmdbId': 'Int32'}
+
+# Normalize edilen sütunlar ve hedefleri (popularity ve vote_count maksimuma,
+# vote_average 10'a bölünür)
+NORM_SOURCE_COLUMNS = ['popularity', 'vote_average', 'vote_count']
+NORM_COLUMNS = ['popularity_norm', 'vote_average_norm', 'vote_count_norm']
+
+# CSV yazımında tek seferde biçimlendirilecek satır sayısı
+CSV_CHUNKSIZE = 1_000_000
+
+# Başlıktaki yıl: son parantez çifti içindeki rakamlar (örn: "Toy Story (1995)")
+TITLE_YEAR_RE = re.compile(r'\((\d+)\)[^()]*$')
+
+# TMDb yanıt önbelleği (tekrar çalıştırmalarda API çağrısı yapılmaz)
+TMDB_CACHE_PATH = os.path.join(DATA_DIR, 'tmdb_cache.sqlite')
+TMDB_CACHE_TTL = 7 * 24 * 60 * 60  # 7 gün
+TMDB_NOT_FOUND_TTL = 24 * 60 * 60  # TMDb'de bulunamayan (404) filmler: 1 gün
+
+# get_tmdb_movie_details'in kesin 404 yanıtı için döndürdüğü işaret
+TMDB_NOT_FOUND = object()
+
 # TMDb API
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
+TMDB_REQUESTS_PER_SECOND = 40  # Hız sınırı
+TMDB_MAX_WORKERS = 20  # Eşzamanlı istek sayısı
+
+# Bağlantı havuzlu oturum: TCP/TLS bağlantıları istekler arasında yeniden kullanılır
+tmdb_session = requests.Session()
+tmdb_session.mount('https://', HTTPAdapter(
+    pool_connections=TMDB_MAX_WORKERS,
+    pool_maxsize=TMDB_MAX_WORKERS,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+class RateLimiter:
+    """İstekleri iş parçacıkları arasında saniyede en fazla `rate` olacak şekilde aralar"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Sıradaki istek zamanı gelene kadar bekle"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+def read_csv_files(files):
+    """
+    CSV dosyalarını eşzamanlı oku
 
-def load_movielens_data():
-    """MovieLens veri setini yükle"""
-    print("MovieLens veri seti yükleniyor...")
-
-    movies_df = pd.read_csv(os.path.join(MOVIELENS_DIR, 'movies.csv'))
-    ratings_df = pd.read_csv(os.path.join(MOVIELENS_DIR, 'ratings.csv'))
-    links_df = pd.read_csv(os.path.join(MOVIELENS_DIR, 'links.csv'))
+    Her dosya ayrı bir iş parçacığında okunur; disk beklemesi ve pandas'ın
+    GIL'i bıraktığı ayrıştırma adımları örtüşür, toplam süre en büyük
+    dosyanın süresine yaklaşır.
 
-    print(f"  - {len(movies_df)} film")
-    print(f"  - {len(ratings_df)} değerlendirme")
-    print(f"  - {len(links_df)} TMDb eşleşmesi")
+    Args:
+        files (dict): ad -> (dosya yolu, dtype eşlemesi)
 
-    return movies_df, ratings_df, links_df
+    Returns:
+        dict: ad -> DataFrame
+    """
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        futures = {name: executor.submit(pd.read_csv, path, dtype=dtype)
+                   for name, (path, dtype) in files.items()}
+        return {name: future.result() for name, future in futures.items()}
 
-def load_existing_data():
-    """Mevcut items.csv ve ratings.csv dosyalarını yükle"""
-    print("\nMevcut veri dosyaları yükleniyor...")
+def load_data():
+    """MovieLens veri setini ve mevcut items.csv / ratings.csv dosyalarını birlikte yükle"""
+    print("MovieLens veri seti ve mevcut veri dosyaları yükleniyor...")
 
     items_path = os.path.join(DATA_DIR, 'items.csv')
     ratings_path = os.path.join(DATA_DIR, 'ratings.csv')
 
+    files = {
+        'movies': (os.path.join(MOVIELENS_DIR, 'movies.csv'), MOVIES_DTYPES),
+        'ml_ratings': (os.path.join(MOVIELENS_DIR, 'ratings.csv'), RATINGS_DTYPES),
+        'links': (os.path.join(MOVIELENS_DIR, 'links.csv'), LINKS_DTYPES)
+    }
+    # Mevcut dosyalar yoksa yeni oluşturulur
     if os.path.exists(items_path):
-        items_df = pd.read_csv(items_path)
+        files['items'] = (items_path, None)
+    if os.path.exists(ratings_path):
+        files['ratings'] = (ratings_path, None)
+
+    frames = read_csv_files(files)
+    movies_df, ratings_df, links_df = frames['movies'], frames['ml_ratings'], frames['links']
+
+    print(f"  - {len(movies_df)} film")
+    print(f"  - {len(ratings_df)} değerlendirme")
+    print(f"  - {len(links_df)} TMDb eşleşmesi")
+
+    if 'items' in frames:
+        items_df = frames['items']
         print(f"  - Mevcut items: {len(items_df)}")
     else:
         items_df = pd.DataFrame()
         print("  - items.csv bulunamadı, yeni oluşturulacak")
 
-    if os.path.exists(ratings_path):
-        existing_ratings = pd.read_csv(ratings_path)
+    if 'ratings' in frames:
+        existing_ratings = frames['ratings']
         print(f"  - Mevcut ratings: {len(existing_ratings)}")
     else:
         existing_ratings = pd.DataFrame()
         print("  - ratings.csv bulunamadı, yeni oluşturulacak")
 
-    return items_df, existing_ratings
+    return movies_df, ratings_df, links_df, items_df, existing_ratings
 
 def get_tmdb_movie_details(tmdb_id):
-    """TMDb API'den film detaylarını al"""
+    """
+    TMDb API'den film detaylarını al
+
+    Film TMDb'de yoksa (404) TMDB_NOT_FOUND, diğer tüm hatalarda (ağ hatası,
+    401, 429, 5xx) None döner.
+    """
     if not TMDB_API_KEY:
         return None
 
@@ -77,115 +164,265 @@ def get_tmdb_movie_details(tmdb_id):
             'language': 'tr-TR',
             'append_to_response': 'credits'
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = tmdb_session.get(url, params=params, timeout=10)
         if response.status_code == 200:
             return response.json()
+        if response.status_code == 404:
+            return TMDB_NOT_FOUND
     except Exception as e:
         print(f"    TMDb API hatası (ID: {tmdb_id}): {e}")
     return None
 
-def create_item_from_movielens(movie_row, links_df, existing_tmdb_ids):
-    """MovieLens filminden item oluştur"""
-    movie_id = movie_row['movieId']
+def in_sorted(values, sorted_ids):
+    """values içindeki her değerin sıralı sorted_ids dizisinde olup olmadığını döndür"""
+    if len(sorted_ids) == 0:
+        return np.zeros(len(values), dtype=bool)
+    idx = np.searchsorted(sorted_ids, values)
+    return sorted_ids[np.minimum(idx, len(sorted_ids) - 1)] == values
 
-    # TMDb ID'yi bul
-    link_row = links_df[links_df['movieId'] == movie_id]
-    if link_row.empty or pd.isna(link_row['tmdbId'].values[0]):
-        return None
+def create_items_from_movielens(movies_df, links_df, existing_tmdb_ids):
+    """
+    MovieLens filmlerinden yeni items tablosunu tek seferde (sütun bazında) oluştur
 
-    tmdb_id = int(link_row['tmdbId'].values[0])
+    TMDb ID'si olmayan, zaten var olan veya aynı TMDb ID'ye sahip önceki bir
+    filmle çakışan kayıtlar atlanır. existing_tmdb_ids sıralı bir dizi olmalıdır.
+    Ham TMDb yanıtları tabloya konmaz, TMDb önbelleğinde (sqlite) item_id ile tutulur.
+    """
+    # movieId -> tmdbId eşleştirmesi (tekrarlanan movieId'de ilk kayıt geçerli).
+    # TMDb ID'si olmayan ve zaten var olan filmler birleştirmeden önce küçük
+    # links tablosunda elenir; movies_df yalnızca yeni item olacak satırlarla eşleşir
+    links = links_df[['movieId', 'tmdbId']].drop_duplicates('movieId').dropna()
+    links = links.astype({'tmdbId': 'int64'})
+    links = links[~in_sorted(links['tmdbId'].to_numpy(), existing_tmdb_ids)]
 
-    # Zaten varsa atla
-    if tmdb_id in existing_tmdb_ids:
-        return None
+    # Aynı TMDb ID'ye eşlenen filmlerden ilki eklenir
+    merged = movies_df.merge(links, on='movieId', how='inner', validate='many_to_one')
+    merged = merged.drop_duplicates('tmdbId')
 
-    # Temel bilgiler
-    title = movie_row['title']
-    genres = movie_row['genres'].replace('|', ', ') if pd.notna(movie_row['genres']) else ''
+    title = merged['title']
+    genres = merged['genres'].str.replace('|', ', ', regex=False).fillna('')
 
     # Yılı başlıktan çıkar (örn: "Toy Story (1995)" -> 1995)
-    release_year = None
-    if '(' in title and ')' in title:
-        try:
-            year_str = title[title.rfind('(')+1:title.rfind(')')]
-            if year_str.isdigit():
-                release_year = int(year_str)
-        except:
-            pass
-
-    item = {
-        'item_id': tmdb_id,
-        'title': title,
-        'overview': '',
-        'poster_path': '',
-        'release_date': f"{release_year}-01-01" if release_year else '',
-        'vote_average': 0,
-        'vote_count': 0,
-        'popularity': 0,
-        'original_language': 'en',
-        'content_type': 'movie',
-        'tmdb_details': '{}',
-        'genres': genres,
-        'release_year': release_year if release_year else 0,
-        'popularity_norm': 0,
-        'vote_average_norm': 0,
-        'vote_count_norm': 0,
-        'features_text': f"{title} {genres}"
-    }
+    release_year = (pd.to_numeric(title.str.extract(TITLE_YEAR_RE, expand=False))
+                    .fillna(0)
+                    .astype('int32'))
+    release_date = (release_year.astype(str) + '-01-01').where(release_year > 0, '')
+
+    # Sütunlar açık tiplerle önceden ayrılmış dizilerden kurulur;
+    # satır satır tip çıkarımı ve kopyalama yapılmaz
+    n = len(merged)
+    new_items = pd.DataFrame({
+        'item_id': merged['tmdbId'].to_numpy(dtype='int64'),
+        'title': title.to_numpy(dtype=object),
+        'overview': np.full(n, '', dtype=object),
+        'poster_path': np.full(n, '', dtype=object),
+        'release_date': release_date.to_numpy(dtype=object),
+        'vote_average': np.zeros(n, dtype='float64'),
+        'vote_count': np.zeros(n, dtype='int64'),
+        'popularity': np.zeros(n, dtype='float64'),
+        'original_language': np.full(n, 'en', dtype=object),
+        'content_type': np.full(n, 'movie', dtype=object),
+        'genres': genres.to_numpy(dtype=object),
+        'release_year': release_year.to_numpy(dtype='int32'),
+        'popularity_norm': np.zeros(n, dtype='float32'),
+        'vote_average_norm': np.zeros(n, dtype='float32'),
+        'vote_count_norm': np.zeros(n, dtype='float32'),
+        'features_text': title.str.cat(genres, sep=' ', na_rep='').to_numpy(dtype=object)
+    }, copy=False)
+
+    return new_items
+
+
+def open_tmdb_cache():
+    """TMDb önbellek veritabanını aç, tablo yoksa oluştur"""
+    conn = sqlite3.connect(TMDB_CACHE_PATH)
+    conn.execute('CREATE TABLE IF NOT EXISTS tmdb (id INTEGER PRIMARY KEY, fetched_at INTEGER, json BLOB)')
+    return conn
+
+def read_tmdb_cache(conn, tmdb_ids):
+    """Süresi dolmamış önbellek kayıtlarını tmdb_id -> detay olarak döndür (bulunamayan filmler None)"""
+    now = int(time.time())
+    cutoff, not_found_cutoff = now - TMDB_CACHE_TTL, now - TMDB_NOT_FOUND_TTL
+    cached = {}
+    # SQLite parametre sınırını aşmamak için parça parça sorgula
+    for start in range(0, len(tmdb_ids), 500):
+        chunk = tmdb_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        rows = conn.execute(f'SELECT id, json FROM tmdb '
+                            f'WHERE fetched_at > (CASE WHEN json IS NULL THEN ? ELSE ? END) '
+                            f'AND id IN ({placeholders})',
+                            [not_found_cutoff, cutoff, *chunk])
+        cached.update((tmdb_id, json.loads(data) if data is not None else None) for tmdb_id, data in rows)
+    return cached
+
+def write_tmdb_cache(conn, details_by_id):
+    """
+    Yeni alınan detayları tek bir işlemde önbelleğe yaz
 
-    return item
+    TMDb'de bulunamayan filmler (None) json alanı NULL olarak, daha kısa
+    TMDB_NOT_FOUND_TTL süresiyle saklanır; her çalıştırmada yeniden sorgulanmaz.
+    """
+    now = int(time.time())
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO tmdb (id, fetched_at, json) VALUES (?, ?, ?)',
+                         [(tmdb_id, now, json.dumps(details) if details is not None else None)
+                          for tmdb_id, details in details_by_id.items()])
 
-def enrich_with_tmdb(item, tmdb_id):
-    """TMDb API'den ek bilgiler al"""
-    details = get_tmdb_movie_details(tmdb_id)
-    if details:
-        item['overview'] = details.get('overview', '')
-        item['poster_path'] = details.get('poster_path', '')
-        item['release_date'] = details.get('release_date', item['release_date'])
-        item['vote_average'] = details.get('vote_average', 0)
-        item['vote_count'] = details.get('vote_count', 0)
-        item['popularity'] = details.get('popularity', 0)
-        item['original_language'] = details.get('original_language', 'en')
+def fetch_tmdb_details(tmdb_ids):
+    """
+    TMDb detaylarını al: önce yerel önbellekten, eksikleri TMDb API'den
 
-        # Genres from TMDb
-        if 'genres' in details:
-            item['genres'] = ', '.join([g['name'] for g in details['genres']])
+    Args:
+        tmdb_ids: Detayı alınacak TMDb ID'leri
 
-        # Release year
-        if details.get('release_date'):
-            try:
-                item['release_year'] = int(details['release_date'][:4])
-            except:
-                pass
+    Returns:
+        dict: tmdb_id -> TMDb detayları (yalnızca başarılı yanıtlar)
+    """
+    tmdb_ids = [int(tmdb_id) for tmdb_id in tmdb_ids]
 
-        # Features text
-        item['features_text'] = f"{item['title']} {item['genres']} {item['overview']}"
+    conn = open_tmdb_cache()
+    try:
+        # Önbellekteki bulunamayan filmler (None) da isabet sayılır
+        details_by_id = read_tmdb_cache(conn, tmdb_ids)
+        missing_ids = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id not in details_by_id]
+        print(f"  - {len(details_by_id)} film önbellekten, {len(missing_ids)} film TMDb'den alınacak")
+
+        if missing_ids and not TMDB_API_KEY:
+            print("  - TMDB_API_KEY tanımlı değil, eksik filmler zenginleştirilmeyecek")
+        elif missing_ids:
+            fetched = download_tmdb_details(missing_ids)
+            write_tmdb_cache(conn, fetched)
+            details_by_id.update(fetched)
+    finally:
+        conn.close()
+
+    return {tmdb_id: details for tmdb_id, details in details_by_id.items() if details is not None}
+
+def download_tmdb_details(tmdb_ids):
+    """
+    TMDb detaylarını eşzamanlı ve hız sınırlı olarak API'den indir
 
-    return item
+    TMDb'de bulunamayan (404) filmler None olarak döner; geçici hatalar
+    (ağ, 401, 429, 5xx) sonuca hiç girmez, önbelleğe yazılmaz.
+    """
+    limiter = RateLimiter(TMDB_REQUESTS_PER_SECOND)
+
+    def fetch(tmdb_id):
+        limiter.wait()
+        return tmdb_id, get_tmdb_movie_details(tmdb_id)
+
+    details_by_id = {}
+    with ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS) as executor:
+        for done, (tmdb_id, details) in enumerate(executor.map(fetch, tmdb_ids), start=1):
+            if details is TMDB_NOT_FOUND:
+                details_by_id[tmdb_id] = None
+            elif details:
+                details_by_id[tmdb_id] = details
+            if done % 100 == 0:
+                print(f"  - {done}/{len(tmdb_ids)} film için TMDb detayı alındı...")
+
+    return details_by_id
+
+def enrich_with_tmdb(items_df, details_by_id):
+    """TMDb detaylarını items tablosuna sütun bazında işle"""
+    if not details_by_id:
+        return items_df
+
+    # Yanıtta olmayan alanlar None kalır ve update() tarafından atlanır
+    details = pd.DataFrame.from_records([{
+        'item_id': tmdb_id,
+        'overview': d.get('overview', ''),
+        'poster_path': d.get('poster_path', ''),
+        'release_date': d.get('release_date'),
+        'vote_average': d.get('vote_average', 0),
+        'vote_count': d.get('vote_count', 0),
+        'popularity': d.get('popularity', 0),
+        'original_language': d.get('original_language', 'en'),
+        'genres': ', '.join([g['name'] for g in d['genres']]) if 'genres' in d else None
+    } for tmdb_id, d in details_by_id.items()], index='item_id')
+    details['release_year'] = pd.to_numeric(details['release_date'].str[:4], errors='coerce')
+
+    enriched = items_df.set_index('item_id')
+    enriched.update(details)
+    enriched = enriched.reset_index()
+
+    # Features text
+    is_enriched = enriched['item_id'].isin(details.index.to_numpy())
+    features_text = enriched['title'].str.cat([enriched['genres'], enriched['overview']],
+                                              sep=' ', na_rep='')
+    enriched['features_text'] = features_text.where(is_enriched, enriched['features_text'])
+
+    return enriched
 
 def convert_movielens_ratings(ml_ratings_df, links_df):
     """MovieLens ratings'i sistemimize uygun formata dönüştür"""
     print("\nMovieLens ratings dönüştürülüyor...")
 
-    # MovieLens movieId -> TMDb ID eşleştirmesi
-    ml_ratings_df = ml_ratings_df.merge(links_df[['movieId', 'tmdbId']], on='movieId', how='left')
+    # MovieLens movieId -> TMDb ID eşleştirmesi; TMDb ID'si olmayan filmler
+    # birleştirmeden önce çıkarılır, iç birleştirme eşleşmeyen satırları hiç üretmez
+    links = links_df[['movieId', 'tmdbId']].dropna().drop_duplicates('movieId')
+    links = links.astype({'tmdbId': 'int32'})
+    ml_ratings_df = ml_ratings_df.merge(links, on='movieId', how='inner', validate='many_to_one')
 
-    # TMDb ID'si olmayan kayıtları çıkar
-    ml_ratings_df = ml_ratings_df.dropna(subset=['tmdbId'])
-    ml_ratings_df['tmdbId'] = ml_ratings_df['tmdbId'].astype(int)
+    # Mevcut kullanıcılarla çakışmaması için offset; merge yeni bir tablo
+    # döndürdüğünden sütun yerinde güncellenir, geçici kopya oluşmaz
+    ml_ratings_df['userId'] += 1000
 
     # Sistemimize uygun format
-    converted_ratings = pd.DataFrame({
-        'user_id': ml_ratings_df['userId'] + 1000,  # Mevcut kullanıcılarla çakışmaması için offset
-        'item_id': ml_ratings_df['tmdbId'],
-        'rating': ml_ratings_df['rating'],
-        'timestamp': ml_ratings_df['timestamp']
-    })
+    converted_ratings = ml_ratings_df.rename(columns={'userId': 'user_id', 'tmdbId': 'item_id'})
+    converted_ratings = converted_ratings[['user_id', 'item_id', 'rating', 'timestamp']]
 
     print(f"  - {len(converted_ratings)} rating dönüştürüldü")
 
     return converted_ratings
 
+def save_csv(df, path):
+    """
+    Tabloyu CSV olarak yaz
+
+    Önce geçici dosyaya yazılıp yerine taşınır; uygulama yazım sırasında
+    yarım kalmış bir dosya okumaz.
+    """
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False, chunksize=CSV_CHUNKSIZE, lineterminator='\n')
+    os.replace(tmp_path, path)
+
+def append_csv(df, path):
+    """
+    Satırları mevcut CSV dosyasının sonuna ekle
+
+    Yalnızca yeni satırlar yazılır, yazım maliyeti toplam değil yeni satır
+    sayısıyla büyür. Sütun sırası dosya başlığıyla aynı olmalıdır.
+    """
+    df.to_csv(path, mode='a', header=False, index=False, chunksize=CSV_CHUNKSIZE, lineterminator='\n')
+
+def concat_frames(existing_df, new_df):
+    """
+    Yeni tabloyu mevcut tablonun altına ekle
+
+    Ortak sütunlar, veri kaybı olmadan dönüştürülebiliyorsa önceden mevcut
+    tablonun tipine getirilir; böylece pd.concat her sütunu tek bir dizi
+    birleştirmesiyle kurar, tip çözümlemesi ve object'e düşme olmaz.
+    """
+    if existing_df.empty:
+        return new_df
+
+    dtypes = {}
+    for column in new_df.columns.intersection(existing_df.columns):
+        source, target = new_df[column].dtype, existing_df[column].dtype
+        if isinstance(source, np.dtype) and isinstance(target, np.dtype) and np.can_cast(source, target):
+            dtypes[column] = target
+
+    return pd.concat([existing_df, new_df.astype(dtypes)], ignore_index=True)
+
+def downcast_ids(df, columns):
+    """Tamsayı kimlik sütunlarını, değerler sığıyorsa yerinde int32'ye indir"""
+    int32 = np.iinfo(np.int32)
+    for column in columns:
+        values = df[column]
+        if values.dtype.kind in 'iu' and (values.empty or (values.min() >= int32.min and values.max() <= int32.max)):
+            df[column] = values.astype('int32')
+
 def integrate_movielens(enrich_from_tmdb=False, max_movies=None, sample_ratings=None):
     """
     MovieLens veri setini entegre et
@@ -200,94 +437,99 @@ def integrate_movielens(enrich_from_tmdb=False, max_movies=None, sample_ratings=
     print("=" * 60)
 
     # Veri yükle
-    movies_df, ml_ratings_df, links_df = load_movielens_data()
-    existing_items, existing_ratings = load_existing_data()
+    movies_df, ml_ratings_df, links_df, existing_items, existing_ratings = load_data()
 
-    # Mevcut TMDb ID'leri
-    existing_tmdb_ids = set()
+    # Mevcut TMDb ID'leri: sıralı ve tekil int64 dizisi; aday ID'lerin üyeliği
+    # in_sorted ile (searchsorted) test edilir
+    existing_tmdb_ids = np.empty(0, dtype='int64')
     if not existing_items.empty and 'item_id' in existing_items.columns:
-        existing_tmdb_ids = set(existing_items['item_id'].values)
+        existing_tmdb_ids = np.unique(existing_items['item_id'].to_numpy(dtype='int64'))
 
     print(f"\nMevcut TMDb ID sayısı: {len(existing_tmdb_ids)}")
 
     # Yeni filmler oluştur
     print("\nYeni filmler oluşturuluyor...")
-    new_items = []
-    processed = 0
-    added = 0
-
     movies_to_process = movies_df if max_movies is None else movies_df.head(max_movies)
+    new_items_df = create_items_from_movielens(movies_to_process, links_df, existing_tmdb_ids)
+    print(f"  - {len(movies_to_process)} film işlendi")
 
-    for idx, movie_row in movies_to_process.iterrows():
-        item = create_item_from_movielens(movie_row, links_df, existing_tmdb_ids)
-
-        if item:
-            if enrich_from_tmdb:
-                item = enrich_with_tmdb(item, item['item_id'])
-                time.sleep(0.25)  # Rate limiting
-
-            new_items.append(item)
-            existing_tmdb_ids.add(item['item_id'])
-            added += 1
+    if enrich_from_tmdb and not new_items_df.empty:
+        print("\nTMDb detayları alınıyor...")
+        details_by_id = fetch_tmdb_details(new_items_df['item_id'].tolist())
+        new_items_df = enrich_with_tmdb(new_items_df, details_by_id)
 
-            if added % 100 == 0:
-                print(f"  - {added} yeni film eklendi...")
-
-        processed += 1
-        if processed % 500 == 0:
-            print(f"  - {processed}/{len(movies_to_process)} film işlendi")
-
-    print(f"\nToplam {added} yeni film eklendi")
+    print(f"\nToplam {len(new_items_df)} yeni film eklendi")
 
     # Items birleştir ve kaydet
-    if new_items:
-        new_items_df = pd.DataFrame(new_items)
-
-        if not existing_items.empty:
-            combined_items = pd.concat([existing_items, new_items_df], ignore_index=True)
-        else:
-            combined_items = new_items_df
-
-        # Normalizasyon
-        if 'popularity' in combined_items.columns:
-            max_pop = combined_items['popularity'].max()
-            if max_pop > 0:
-                combined_items['popularity_norm'] = combined_items['popularity'] / max_pop
-
-        if 'vote_average' in combined_items.columns:
-            combined_items['vote_average_norm'] = combined_items['vote_average'] / 10.0
-
-        if 'vote_count' in combined_items.columns:
-            max_votes = combined_items['vote_count'].max()
-            if max_votes > 0:
-                combined_items['vote_count_norm'] = combined_items['vote_count'] / max_votes
+    if not new_items_df.empty:
+        combined_items = concat_frames(existing_items, new_items_df)
+
+        # Normalizasyon: üç sütun tek bir dizi üzerinde tek geçişte bölünür.
+        # Maksimumu 0 olan sütunun mevcut normalize değeri korunur.
+        values = combined_items[NORM_SOURCE_COLUMNS].to_numpy(dtype=np.float64)
+        max_pop, _, max_votes = np.nanmax(values, axis=0)
+        scale = np.array([max_pop, 10.0, max_votes])
+        valid = scale > 0
+        norm_columns = [column for column, ok in zip(NORM_COLUMNS, valid) if ok]
+        normalized = values[:, valid] / scale[valid]
+
+        # Maksimumlar değişmediyse mevcut satırların normalize değerleri aynı
+        # kalır; bu durumda dosya yeniden yazılmaz, yalnızca yeni satırlar eklenir
+        n_existing = len(existing_items)
+        append_items = (n_existing > 0
+                        and list(combined_items.columns) == list(existing_items.columns)
+                        and np.array_equal(normalized[:n_existing],
+                                           existing_items[norm_columns].to_numpy(dtype=np.float64),
+                                           equal_nan=True))
+        combined_items[norm_columns] = normalized
 
         # Kaydet
         items_path = os.path.join(DATA_DIR, 'items.csv')
-        combined_items.to_csv(items_path, index=False)
+        if append_items:
+            append_csv(combined_items.iloc[n_existing:], items_path)
+        else:
+            save_csv(combined_items, items_path)
         print(f"\nItems kaydedildi: {items_path}")
         print(f"  - Toplam: {len(combined_items)} film")
 
     # Ratings dönüştür ve kaydet
     print("\n" + "-" * 40)
 
-    if sample_ratings:
-        ml_ratings_sample = ml_ratings_df.sample(n=min(sample_ratings, len(ml_ratings_df)), random_state=42)
+    if sample_ratings and sample_ratings < len(ml_ratings_df):
+        # Tüm tabloyu karıştırmadan tam sample_ratings kadar satır seç; seçilen
+        # konumlar sıralanır, böylece dosya sırası korunur
+        rng = np.random.default_rng(42)
+        positions = np.sort(rng.choice(len(ml_ratings_df), size=sample_ratings, replace=False, shuffle=False))
+        ml_ratings_sample = ml_ratings_df.take(positions)
     else:
         ml_ratings_sample = ml_ratings_df
 
     converted_ratings = convert_movielens_ratings(ml_ratings_sample, links_df)
-
-    if not existing_ratings.empty:
-        combined_ratings = pd.concat([existing_ratings, converted_ratings], ignore_index=True)
-    else:
-        combined_ratings = converted_ratings
-
-    # Duplikatları kaldır (aynı user-item çifti)
-    combined_ratings = combined_ratings.drop_duplicates(subset=['user_id', 'item_id'], keep='last')
+    del ml_ratings_df, ml_ratings_sample
+
+    n_existing = len(existing_ratings)
+    existing_columns = list(existing_ratings.columns)
+    combined_ratings = concat_frames(existing_ratings, converted_ratings)
+    # Büyük ara tablolar birleştirmeden sonra bırakılır (tepe bellek düşer)
+    del existing_ratings, converted_ratings
+
+    # Duplikatları kaldır (aynı user-item çifti, sonradan eklenen MovieLens kaydı geçerli).
+    # Anahtar sütunlar int32'ye indirilir; hash anahtarı küçülür
+    downcast_ids(combined_ratings, ['user_id', 'item_id'])
+    duplicated = combined_ratings.duplicated(subset=['user_id', 'item_id'], keep='last').to_numpy()
+
+    # Mevcut satırlardan hiçbiri düşmediyse dosya aynen kalır, yeni satırlar eklenir
+    append_ratings = (n_existing > 0
+                      and list(combined_ratings.columns) == existing_columns
+                      and not duplicated[:n_existing].any())
+    if duplicated.any():
+        combined_ratings = combined_ratings[~duplicated].reset_index(drop=True)
 
     ratings_path = os.path.join(DATA_DIR, 'ratings.csv')
-    combined_ratings.to_csv(ratings_path, index=False)
+    if append_ratings:
+        append_csv(combined_ratings.iloc[n_existing:], ratings_path)
+    else:
+        save_csv(combined_ratings, ratings_path)
     print(f"\nRatings kaydedildi: {ratings_path}")
     print(f"  - Toplam: {len(combined_ratings)} rating")
 
@@ -295,7 +537,7 @@ def integrate_movielens(enrich_from_tmdb=False, max_movies=None, sample_ratings=
     print("Entegrasyon tamamlandı!")
     print("=" * 60)
 
-    return combined_items if new_items else existing_items, combined_ratings
+    return combined_items if not new_items_df.empty else existing_items, combined_ratings
 
 def quick_integrate():
     """
@@ -9,6 +9,7 @@ from scipy.sparse.linalg import svds
 import joblib
 import os
 import logging
+from .ranking import top_k_indices
 
 logger = logging.getLogger(__name__)
 
@@ -179,6 +180,20 @@ class CollaborativeFiltering:
             self.user_factors = np.random.rand(matrix.shape[0], factors) * 0.1
             self.item_factors = np.random.rand(matrix.shape[1], factors) * 0.1
             logger.info("SVD hatası nedeniyle rastgele faktörler üretildi")
+        
+        self._pack_factors()
+    
+    def _pack_factors(self):
+        """
+        Faktör matrislerini bitişik (C-contiguous) float32 dizilere çevirir
+        
+        Böylece item_factors @ user_vector tek bir vektörize BLAS çağrısı olarak,
+        float64'e göre yarı bellek trafiğiyle hesaplanır.
+        """
+        if self.user_factors is not None:
+            self.user_factors = np.ascontiguousarray(self.user_factors, dtype=np.float32)
+        if self.item_factors is not None:
+            self.item_factors = np.ascontiguousarray(self.item_factors, dtype=np.float32)
     
     def predict(self, user_id, item_id):
         """
@@ -316,6 +331,7 @@ class CollaborativeFiltering:
         
         # Kullanıcının izledikleri
         watched = set()
+        watched_indices = None
         if exclude_watched:
             watched_indices = np.where(self.user_item_matrix[user_idx, :] > 0)[0]
             watched = {self.rev_item_map[idx] for idx in watched_indices}
@@ -326,8 +342,8 @@ class CollaborativeFiltering:
                 # Kullanıcının faktör vektörü
                 user_vector = self.user_factors[user_idx, :]
                 
-                # Tüm öğelerle benzerlik hesapla
-                item_scores = np.dot(self.item_factors, user_vector)
+                # Tüm öğelerle benzerlik hesapla (float32 matris-vektör çarpımı)
+                item_scores = self.item_factors @ user_vector
                 
                 # Bias ekle
                 item_scores = item_scores + self.global_mean + self.user_bias[user_idx] + self.item_bias
@@ -337,15 +353,10 @@ class CollaborativeFiltering:
                 max_rating = 5.0
                 item_scores = np.clip(item_scores, min_rating, max_rating)
                 
-                # En yüksek puanlı öğeleri seç
-                top_indices = np.argsort(item_scores)[::-1]
-                
-                # İzlenen öğeleri filtrele
-                if exclude_watched:
-                    top_indices = [i for i in top_indices if self.rev_item_map[i] not in watched]
+                # İzlenenler hariç en yüksek puanlı n öğeyi seç (tam sıralama yapmadan)
+                top_indices = top_k_indices(item_scores, n, exclude=watched_indices)
                 
-                # İlk n öğeyi al
-                predictions = [(self.rev_item_map[i], item_scores[i]) for i in top_indices[:n]]
+                predictions = [(self.rev_item_map[i], item_scores[i]) for i in top_indices]
                 return predictions
             except Exception as e:
                 logger.error(f"Verimli öneri hatası: {str(e)}, yedek yönteme geçiliyor")
@@ -376,19 +387,24 @@ class CollaborativeFiltering:
         logger.info(f"Model kaydedildi: {filepath}")
     
     @classmethod
-    def load(cls, filepath):
+    def load(cls, filepath, mmap_mode=None):
         """
         Modeli yükle
         
         Args:
             filepath (str): Kayıt yolu
+            mmap_mode (str, optional): 'r' verilirse NumPy dizileri kopyalanmadan
+                dosyadan bellek eşlemeli (salt okunur) açılır
             
         Returns:
             CollaborativeFiltering: Yüklenen model
         """
         if os.path.exists(filepath):
             logger.info(f"Model yükleniyor: {filepath}")
-            return joblib.load(filepath)
+            model = joblib.load(filepath, mmap_mode=mmap_mode)
+            # Eski kayıtlardaki float64 faktörleri de aynı düzene getir
+            model._pack_factors()
+            return model
         else:
             logger.warning(f"Model bulunamadı: {filepath}")
             return None 
\ No newline at end of file
@@ -11,6 +11,7 @@ import os
 import logging
 from collections import defaultdict
 import re
+from .ranking import top_k_indices
 
 logger = logging.getLogger(__name__)
 
@@ -94,8 +95,9 @@ class ContentBasedFiltering:
             # item_features'ı da ayarla (user profile oluşturma için gerekli)
             self.item_features = self.tfidf_matrix
 
-            # Kosinüs benzerlik matrisini oluştur
-            self.cosine_sim = cosine_similarity(self.tfidf_matrix, self.tfidf_matrix)
+            # TF-IDF satırları L2 normalize olduğundan kosinüs benzerliği tek bir
+            # satır çarpımıdır; N x N yoğun matris yerine istek anında hesaplanır
+            self.cosine_sim = None
 
             print(f"İçerik tabanlı model oluşturuldu: {len(self.items_df)} öğe, {self.tfidf_matrix.shape[1]} özellik")
         except Exception as e:
@@ -103,7 +105,7 @@ class ContentBasedFiltering:
             # Boş matrisi oluştur
             self.tfidf_matrix = None
             self.item_features = None
-            self.cosine_sim = np.zeros((len(self.items_df), len(self.items_df)))
+            self.cosine_sim = None
         
         return self
     
@@ -192,10 +194,7 @@ class ContentBasedFiltering:
                 
             # Kullanıcının profil vektörünü hesapla
             user_profile = np.zeros(self.item_features.shape[1])
-            for _, row in liked_items.iterrows():
-                item_id = row['item_id']
-                rating = row['rating']
-                
+            for item_id, rating in liked_items[['item_id', 'rating']].itertuples(index=False, name=None):
                 # İçerik modelimizde bu öğe var mı?
                 if item_id in self.item_map:
                     item_idx = self.item_map[item_id]
@@ -255,18 +254,14 @@ class ContentBasedFiltering:
         idx = self.item_indices[item_id]
         
         # Benzerlik skorlarını al
-        if self.cosine_sim is None or idx >= len(self.cosine_sim):
-            print(f"Cosine similarity matrisi yetersiz. Matris boyutu: {self.cosine_sim.shape if self.cosine_sim is not None else 'Yok'}, İstenen indeks: {idx}")
+        row = self._similarity_row(idx)
+        if row is None:
+            print(f"Benzerlik skorları hesaplanamadı. İstenen indeks: {idx}")
             return []
             
-        sim_scores = list(enumerate(self.cosine_sim[idx]))
-        
-        # Kendisi hariç benzerlik skorlarına göre sırala
-        sim_scores = [(i, score) for i, score in sim_scores if i != idx]
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        
-        # En benzer n öğeyi al
-        sim_scores = sim_scores[:n]
+        # Kendisi hariç en benzer n öğeyi al (tam sıralama yapmadan)
+        top_indices = top_k_indices(row, n, exclude=[idx])
+        sim_scores = [(i, row[i]) for i in top_indices]
         
         # Benzerlik limitini düşürelim - daha fazla uyumlu öğe bulsun
         # sim_scores = [(i, score) for i, score in sim_scores if score > 0.01]
@@ -282,6 +277,26 @@ class ContentBasedFiltering:
         
         return similar_items
     
+    def _similarity_row(self, idx):
+        """
+        Bir öğenin tüm öğelerle kosinüs benzerliğini döndürür
+
+        Args:
+            idx (int): Öğenin model indeksi
+
+        Returns:
+            np.ndarray: Benzerlik skorları veya hesaplanamıyorsa None
+        """
+        if self.tfidf_matrix is not None and idx < self.tfidf_matrix.shape[0]:
+            return (self.tfidf_matrix[idx] @ self.tfidf_matrix.T).toarray().ravel()
+
+        # Eski kayıtlı modellerde yoğun matris bulunabilir
+        cosine_sim = getattr(self, 'cosine_sim', None)
+        if cosine_sim is not None and idx < len(cosine_sim):
+            return cosine_sim[idx]
+
+        return None
+
     def recommend_for_user(self, user_id, n=10, exclude_watched=True, ratings_df=None):
         """
         Kullanıcı için önerileri döndürür
@@ -338,22 +353,17 @@ class ContentBasedFiltering:
         # İçerik-kullanıcı benzerliği
         similarity_scores = cosine_similarity(user_profile, self.item_features).flatten()
         
-        # Her öğe için puan ve ID
-        item_scores = []
-        for idx, score in enumerate(similarity_scores):
-            # Geçerli bir anahtarsa ekle
-            if idx in self.rev_item_map:
-                item_id = self.rev_item_map[idx]
-                item_scores.append((item_id, score))
-        
-        # İzlenen içerikleri filtrele
+        # ID'si olmayan satırları ve izlenen içerikleri hariç tut
+        excluded = np.ones(len(similarity_scores), dtype=bool)
+        excluded[list(self.rev_item_map.keys())] = False
         if exclude_watched:
-            item_scores = [(item_id, score) for item_id, score in item_scores if item_id not in watched]
+            watched_indices = [self.item_map[item_id] for item_id in watched if item_id in self.item_map]
+            excluded[watched_indices] = True
         
-        # En yüksek puanlara göre sırala
-        item_scores.sort(key=lambda x: x[1], reverse=True)
+        # En yüksek puanlı n öğeyi seç (tam sıralama yapmadan)
+        top_indices = top_k_indices(similarity_scores, n, exclude=excluded)
         
-        return item_scores[:n]
+        return [(self.rev_item_map[idx], similarity_scores[idx]) for idx in top_indices]
     
     def _find_similar_user(self, user_id, ratings_df):
         """
@@ -398,10 +408,7 @@ class ContentBasedFiltering:
         user_profile = np.zeros(self.item_features.shape[1])
         profile_items_count = 0
         
-        for _, row in liked_items.iterrows():
-            item_id = row['item_id']
-            rating = row['rating']
-            
+        for item_id, rating in liked_items[['item_id', 'rating']].itertuples(index=False, name=None):
             # İçerik modelimizde bu öğe var mı?
             if item_id in self.item_map:
                 item_idx = self.item_map[item_id]
@@ -433,19 +440,25 @@ class ContentBasedFiltering:
         logger.info(f"Model kaydedildi: {filepath}")
     
     @classmethod
-    def load(cls, filepath):
+    def load(cls, filepath, mmap_mode=None):
         """
         Modeli yükle
         
         Args:
             filepath (str): Kayıt yolu
+            mmap_mode (str, optional): 'r' verilirse NumPy dizileri kopyalanmadan
+                dosyadan bellek eşlemeli (salt okunur) açılır
             
         Returns:
             ContentBasedFiltering: Yüklenen model
         """
         if os.path.exists(filepath):
             logger.info(f"Model yükleniyor: {filepath}")
-            return joblib.load(filepath)
+            model = joblib.load(filepath, mmap_mode=mmap_mode)
+            # TF-IDF matrisi varsa eski kayıtlardaki yoğun benzerlik matrisine gerek yok
+            if getattr(model, 'tfidf_matrix', None) is not None:
+                model.cosine_sim = None
+            return model
         else:
             logger.warning(f"Model bulunamadı: {filepath}")
             return None 
\ No newline at end of file
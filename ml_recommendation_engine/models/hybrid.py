@@ -83,6 +83,7 @@ class HybridRecommender:
             # Değerlendirme dataframe'ini veri yapılarımızda sakla
             self.ratings_df = ratings_df.copy()
             self.items_df = items_df.copy()
+            self._genres_by_item = None
             
             self.is_fitted = True
             logger.info("HybridRecommender.fit tamamlandı")
@@ -93,6 +94,33 @@ class HybridRecommender:
             logger.error(f"Model eğitimi hatası: {str(e)}")
             raise
     
+    def _get_genres_by_item(self):
+        """
+        item_id -> tür listesi sözlüğünü döndürür
+        
+        Öneri başına her aday için items_df taramak yerine ilk çağrıda bir kez
+        oluşturulur ve model üzerinde saklanır.
+        
+        Returns:
+            dict: item_id -> [tür, ...]
+        """
+        genres_by_item = getattr(self, '_genres_by_item', None)
+        if genres_by_item is not None:
+            return genres_by_item
+        
+        genres_by_item = {}
+        if hasattr(self, 'items_df') and 'genres' in self.items_df.columns:
+            # Aynı item_id birden fazla kez geçiyorsa ilk satır geçerli
+            first_rows = self.items_df.drop_duplicates('item_id')
+            for item_id, genres in zip(first_rows['item_id'], first_rows['genres']):
+                if isinstance(genres, str) and genres:
+                    genre_list = [g.strip() for g in genres.split(',') if g.strip()]
+                    if genre_list:
+                        genres_by_item[item_id] = genre_list
+        
+        self._genres_by_item = genres_by_item
+        return genres_by_item
+    
     def recommend(self, user_id, n=10, exclude_watched=True, ratings_df=None):
         """
         Kullanıcı için hibrit öneriler oluştur
@@ -139,20 +167,11 @@ class HybridRecommender:
                     genre_counts = {}
                     total_ratings = 0
                     
-                    for _, rating_row in user_ratings.iterrows():
-                        item_id = rating_row['item_id']
-                        
-                        # items_df varsa tür bilgisini al
-                        if hasattr(self, 'items_df'):
-                            item_data = self.items_df[self.items_df['item_id'] == item_id]
-                            if not item_data.empty and 'genres' in item_data.columns:
-                                genres = item_data.iloc[0]['genres']
-                                if isinstance(genres, str) and genres:
-                                    for genre in genres.split(','):
-                                        genre = genre.strip()
-                                        if genre:
-                                            genre_counts[genre] = genre_counts.get(genre, 0) + 1
-                                            total_ratings += 1
+                    genres_by_item = self._get_genres_by_item()
+                    for item_id in user_ratings['item_id']:
+                        for genre in genres_by_item.get(item_id, []):
+                            genre_counts[genre] = genre_counts.get(genre, 0) + 1
+                            total_ratings += 1
                     
                     # Tür bazında bir bias var mı?
                     if total_ratings > 0:
@@ -216,20 +235,14 @@ class HybridRecommender:
         
         # Önerilen içerik tür çeşitliliğini sağla
         genre_diversity = {}
-        if hasattr(self, 'items_df'):
-            try:
-                # Her bir önerilen öğenin türünü belirle
-                for item_id in item_scores.keys():
-                    item_data = self.items_df[self.items_df['item_id'] == item_id]
-                    if not item_data.empty and 'genres' in item_data.columns:
-                        genres = item_data.iloc[0]['genres']
-                        if isinstance(genres, str) and genres:
-                            genre_list = [g.strip() for g in genres.split(',') if g.strip()]
-                            if genre_list:
-                                # Tür bilgisini sakla
-                                genre_diversity[item_id] = genre_list
-            except Exception as e:
-                logger.warning(f"Tür çeşitliliği analizi sırasında hata: {str(e)}")
+        try:
+            # Her bir önerilen öğenin türünü belirle
+            genres_by_item = self._get_genres_by_item()
+            for item_id in item_scores.keys():
+                if item_id in genres_by_item:
+                    genre_diversity[item_id] = genres_by_item[item_id]
+        except Exception as e:
+            logger.warning(f"Tür çeşitliliği analizi sırasında hata: {str(e)}")
         
         # Puanları normalize et
         if self.normalize_scores and item_scores:
@@ -438,19 +451,28 @@ class HybridRecommender:
         logger.info(f"Model kaydedildi: {filepath}")
     
     @classmethod
-    def load(cls, filepath):
+    def load(cls, filepath, mmap_mode=None):
         """
         Modeli yükle
         
         Args:
             filepath (str): Kayıt yolu
+            mmap_mode (str, optional): 'r' verilirse NumPy dizileri kopyalanmadan
+                dosyadan bellek eşlemeli (salt okunur) açılır
             
         Returns:
             HybridRecommender: Yüklenen model
         """
         if os.path.exists(filepath):
             logger.info(f"Model yükleniyor: {filepath}")
-            return joblib.load(filepath)
+            model = joblib.load(filepath, mmap_mode=mmap_mode)
+            # Gömülü işbirlikçi modelin faktörlerini de bitişik float32 düzene getir
+            if model.cf_model is not None:
+                model.cf_model._pack_factors()
+            # Eski kayıtlardaki yoğun benzerlik matrisini bellekte tutma
+            if model.cb_model is not None and getattr(model.cb_model, 'tfidf_matrix', None) is not None:
+                model.cb_model.cosine_sim = None
+            return model
         else:
             logger.warning(f"Model bulunamadı: {filepath}")
             return None 
\ No newline at end of file
@@ -0,0 +1,36 @@
+"""
+Öneri skorlarını sıralama yardımcıları
+"""
+
+import numpy as np
+
+
+def top_k_indices(scores, k, exclude=None):
+    """
+    Skor dizisindeki en yüksek k değerin indekslerini azalan sırada döndürür
+
+    Tüm diziyi sıralamak (O(N log N)) yerine argpartition ile O(N) seçim yapar;
+    yalnızca seçilen k aday sıralanır.
+
+    Args:
+        scores (np.ndarray): Tek boyutlu skor dizisi
+        k (int): Döndürülecek indeks sayısı
+        exclude (array-like, optional): Hariç tutulacak indeksler veya boolean maske
+
+    Returns:
+        np.ndarray: En yüksek skorlu indeksler (azalan sırada)
+    """
+    scores = np.array(scores, dtype=np.float64)
+    if exclude is not None:
+        scores[exclude] = -np.inf
+
+    k = min(k, int(np.count_nonzero(scores > -np.inf)))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
@@ -21,7 +21,10 @@ def create_app() -> Any:
     os.environ.setdefault("USE_PRODUCTION_SERVER", "1")
 
     # app.py içindeki global `app` tanımını içe aktar
-    from app import app  # noqa: WPS433 (run-time import intentional)
+    from app import app, start_popular_refresher  # noqa: WPS433 (run-time import intentional)
+
+    # Popüler listeler istek yolunda değil, arka planda yenilenir
+    start_popular_refresher()
 
     return app
 